@@ -6,6 +6,9 @@ import urllib.parse
 from datetime import datetime
 import uuid 
 import numpy as np 
+import hashlib
+import threading
+from collections import OrderedDict
 
 # ==========================================
 # 0. 設置唯一身份識別碼 (UUID)
@@ -52,7 +55,7 @@ def get_client():
 @st.cache_data(ttl=10)
 def load_data():
     client = get_client()
-    if not client: return {}, []
+    if not client: return {}, [], None
     
     try:
         ss = client.open_by_key(SPREADSHEET_ID)
@@ -84,10 +87,11 @@ def load_data():
             orders = ws_orders.get_all_records()
         except Exception: orders = []
 
-        return shops_db, orders
+        # 每次重新載入產生新的快照 ID，供搜尋索引判斷是否需要重建
+        return shops_db, orders, search_snapshot_id(shops_db)
     except Exception: 
         st.error("數據庫載入失敗，請檢查權限或 ID 是否正確。")
-        return {}, []
+        return {}, [], None
 
 def delete_order(idx):
     client = get_client()
@@ -160,6 +164,204 @@ def add_shop_to_sheet(data):
         st.error("新增失敗，請檢查數據庫工作表名稱或權限。")
         return False
 
+# --- 批量匯入店家 (CSV/XLSX) ---
+BULK_PRICE_RANGE = (1, 10000)   # 價格允許範圍
+BULK_STOCK_RANGE = (1, 1000)    # 初始庫存允許範圍
+BULK_COLUMNS = ['地區', '店名', '價格', '初始庫存', '商品名稱']
+
+@st.cache_data(ttl=10)
+def load_all_shop_names():
+    """讀取「店家設定」中所有店名 (含 Inactive)，供批量匯入檢查重複"""
+    client = get_client()
+    if not client: return set()
+    try:
+        ws = client.open_by_key(SPREADSHEET_ID).worksheet("店家設定")
+        return {str(row.get('店名', '')).strip() for row in ws.get_all_records()} - {''}
+    except Exception: return set()
+
+def _parse_bulk_int(value):
+    """整數欄位：小數、inf、nan 等一律視為錯誤，不截斷"""
+    number = float(value)
+    if not number.is_integer(): raise ValueError(value)
+    return int(number)
+
+def read_shop_file(uploaded_file):
+    """讀取上傳的 CSV / XLSX，回傳 DataFrame (全部欄位以字串讀入)"""
+    if uploaded_file.name.lower().endswith('.xlsx'):
+        return pd.read_excel(uploaded_file, dtype=str)
+    try:
+        return pd.read_csv(uploaded_file, dtype=str, encoding='utf-8-sig')
+    except UnicodeDecodeError:
+        # Excel 在繁體中文 Windows 另存 CSV 時為 cp950 (Big5)
+        uploaded_file.seek(0)
+        return pd.read_csv(uploaded_file, dtype=str, encoding='cp950')
+
+def validate_shop_rows(df, existing_names):
+    """一次驗證所有列，回傳 (可匯入的店家資料清單, 預覽 DataFrame)"""
+    df = df.rename(columns=lambda c: str(c).strip())
+    missing = [c for c in BULK_COLUMNS if c not in df.columns and not (c == '商品名稱' and '商品' in df.columns)]
+    if missing:
+        raise ValueError(f"缺少欄位：{', '.join(missing)}")
+
+    valid_rows, preview = [], []
+    seen_names = set()
+    for i, row in df.fillna('').iterrows():
+        shop_name = str(row['店名']).strip()
+        region = clean_region_name(row['地區'])
+        item = str(row.get('商品名稱', '') or row.get('商品', '')).strip() or '剩食套餐'
+        errors = []
+
+        if not shop_name: errors.append("店名為空")
+        elif shop_name in existing_names: errors.append("店名已存在")
+        elif shop_name in seen_names: errors.append("檔案內店名重複")
+        if not region: errors.append("地區為空")
+        elif region == "請在此輸入第一個地區名稱": errors.append("地區名稱無效")
+
+        try:
+            price = _parse_bulk_int(row['價格'])
+            if not BULK_PRICE_RANGE[0] <= price <= BULK_PRICE_RANGE[1]:
+                errors.append(f"價格需介於 {BULK_PRICE_RANGE[0]}-{BULK_PRICE_RANGE[1]}")
+        except (ValueError, OverflowError):
+            price = None
+            errors.append("價格需為整數")
+        try:
+            stock = _parse_bulk_int(row['初始庫存'])
+            if not BULK_STOCK_RANGE[0] <= stock <= BULK_STOCK_RANGE[1]:
+                errors.append(f"庫存需介於 {BULK_STOCK_RANGE[0]}-{BULK_STOCK_RANGE[1]}")
+        except (ValueError, OverflowError):
+            stock = None
+            errors.append("庫存需為整數")
+
+        if shop_name: seen_names.add(shop_name)
+        if not errors:
+            valid_rows.append({
+                "shop_name": shop_name,
+                "region": region,
+                "item": item,
+                "price": price,
+                "stock": stock,
+                "mode": '剩食',
+            })
+        preview.append({
+            '列': i + 2, # 對應檔案列號 (含標題列)
+            '結果': "➕ 新增" if not errors else "❌ " + "、".join(errors),
+            '店名': shop_name, '地區': region, '商品名稱': item, '價格': price, '初始庫存': stock,
+        })
+    return valid_rows, pd.DataFrame(preview)
+
+def add_shops_to_sheet(rows):
+    """批量寫入：一次 append_rows + 一次快取清除"""
+    client = get_client()
+    if not client:
+        st.error("批量匯入失敗。無法連線至數據庫。")
+        return False
+
+    # 欄位順序與 add_shop_to_sheet 相同
+    new_rows = [
+        [d['region'], d['shop_name'], d['price'], d['stock'], d['item'], d['mode'], 0, 0, 'Active']
+        for d in rows
+    ]
+
+    try:
+        ws = client.open_by_key(SPREADSHEET_ID).worksheet("店家設定")
+        ws.append_rows(new_rows, value_input_option='USER_ENTERED')
+    except Exception:
+        st.error("批量匯入失敗，請檢查數據庫工作表名稱或權限。")
+        return False
+
+    st.success(f"✅ 已批量新增 **{len(new_rows)}** 家店家！")
+    st.balloons()
+    st.cache_data.clear()
+    st.rerun()
+
+# --- 店家搜尋索引 (單字 + 雙字 n-gram) ---
+SEARCH_FIELD_WEIGHTS = (('name', 3), ('item', 2), ('region', 1)) # 店名 > 商品 > 地區
+SEARCH_LIMIT = 200       # 搜尋結果最多顯示筆數 (篩選後才截斷)
+SEARCH_MEMO_SIZE = 256   # 每個索引保留的查詢結果數 (LRU)
+
+def _search_text(text):
+    """搜尋用正規化：轉小寫並移除所有空白"""
+    return ''.join(str(text).lower().split())
+
+def _search_grams(text):
+    """單字 + 相鄰雙字 (bigram)，中文無需斷詞即可比對"""
+    text = _search_text(text)
+    grams = set(text)
+    grams.update(text[i:i + 2] for i in range(len(text) - 1))
+    return grams
+
+def search_snapshot_id(shops_db):
+    """以搜尋欄位內容計算快照 ID：店家資料未變時沿用同一份索引"""
+    fields = sorted((name, str(info.get('item', '')), str(info.get('region', ''))) for name, info in shops_db.items())
+    return hashlib.sha1(repr(fields).encode('utf-8')).hexdigest()
+
+def _match_score(score, q, text):
+    """店名前綴 / 包含加分"""
+    if text.startswith(q): return score + 10
+    if q in text: return score + 5
+    return score
+
+@st.cache_resource(max_entries=2)
+def get_search_index(_shops_db, snapshot_id):
+    """每個快照只建立一次索引：{gram: {店名: 權重}} 與每個 gram 的預排序結果"""
+    names = {name: _search_text(name) for name in sorted(_shops_db)}
+
+    # 依店名順序建立，posting 內的插入順序即同分時的排序
+    postings = {}
+    for name in names:
+        info = _shops_db[name]
+        fields = {'name': name, 'item': info.get('item', ''), 'region': info.get('region', '')}
+        for field, weight in SEARCH_FIELD_WEIGHTS:
+            for gram in _search_grams(fields[field]):
+                bucket = postings.setdefault(gram, {})
+                if bucket.get(name, 0) < weight:
+                    bucket[name] = weight
+
+    # 一到兩個字的查詢就是單一 gram：分數只有 13/8/2/1 四種，分桶即完成排序，查詢時直接取用
+    ranked = {}
+    for gram, bucket in postings.items():
+        tiers = {13: [], 8: [], 2: [], 1: []}
+        for name, weight in bucket.items():
+            tiers[_match_score(weight, gram, names[name]) if weight == 3 else weight].append(name)
+        ranked[gram] = tiers[13] + tiers[8] + tiers[2] + tiers[1]
+
+    # memo 由所有 session 共用，需加鎖
+    return {'postings': postings, 'ranked': ranked, 'names': names,
+            'memo': OrderedDict(), 'lock': threading.Lock()}
+
+def search_shops(index, query):
+    """依相關度排序回傳所有符合的店名 (共用清單，請勿修改)；允許部分 bigram 不符 (錯字容忍)"""
+    q = _search_text(query)
+    if not q: return []
+    if len(q) <= 2: return index['ranked'].get(q, [])
+
+    memo, lock = index['memo'], index['lock']
+    with lock:
+        if q in memo:
+            memo.move_to_end(q)
+            return memo[q]
+
+    grams = list(dict.fromkeys(q[i:i + 2] for i in range(len(q) - 1)))
+    min_hits = (len(grams) + 1) // 2 # 至少命中一半的 bigram
+
+    postings = index['postings']
+    scores, hits = {}, {}
+    for gram in grams:
+        for name, weight in postings.get(gram, {}).items():
+            scores[name] = scores.get(name, 0) + weight
+            hits[name] = hits.get(name, 0) + 1
+
+    names = index['names']
+    ranked = sorted((-_match_score(score, q, names[name]), name)
+                    for name, score in scores.items() if hits[name] >= min_hits)
+    result = [name for _, name in ranked]
+
+    with lock:
+        memo[q] = result
+        if len(memo) > SEARCH_MEMO_SIZE:
+            memo.popitem(last=False)
+    return result
+
 def get_shop_status(shop_name, shop_info, orders_df):
     
     claimed_count = 0
@@ -190,7 +392,7 @@ def get_shop_status(shop_name, shop_info, orders_df):
 # ==========================================
 st.set_page_config(page_title="餓不死清單", page_icon="🍱", layout="wide") 
 
-SHOPS_DB, ALL_ORDERS = load_data()
+SHOPS_DB, ALL_ORDERS, DATA_SNAPSHOT = load_data()
 
 if not ALL_ORDERS:
     ORDERS_DF = pd.DataFrame()
@@ -432,6 +634,24 @@ else:
                             "mode": new_mode, 
                         })
             
+            # --- 批量匯入店家 (CSV/XLSX) ---
+            st.divider()
+            st.subheader("📥 批量匯入店家")
+            st.caption(f"檔案需包含欄位：{', '.join(BULK_COLUMNS)}。")
+            bulk_file = st.file_uploader("上傳 CSV / XLSX", type=["csv", "xlsx"], key="bulk_shop_file")
+            if bulk_file is not None:
+                try:
+                    bulk_rows, bulk_preview = validate_shop_rows(
+                        read_shop_file(bulk_file), load_all_shop_names() | set(SHOPS_DB))
+                except Exception as e:
+                    st.error(f"檔案讀取失敗 ({e})。")
+                else:
+                    bulk_invalid = len(bulk_preview) - len(bulk_rows)
+                    st.dataframe(bulk_preview, use_container_width=True, hide_index=True)
+                    st.caption(f"可新增 {len(bulk_rows)} 家，略過 {bulk_invalid} 列。")
+                    if bulk_rows and st.button(f"✅ 確認匯入 {len(bulk_rows)} 家", type="primary", key="bulk_import_btn"):
+                        add_shops_to_sheet(bulk_rows)
+
             # 🚀 快速進入商家後台 
             st.divider()
             st.subheader("🚀 快速進入商家後台")
@@ -510,6 +730,13 @@ else:
     if max_price == min_price: max_price += 10
     
     
+    # 搜尋框 (店名 / 商品 / 地區)
+    search_query = st.text_input(
+        "🔍 搜尋店家或商品",
+        key="shop_search_query",
+        placeholder="例：便當、淡江",
+    )
+
     col_filter_1, col_filter_2 = st.columns([1, 1]) 
 
     # 獲取所有地區名稱 (單層)
@@ -542,13 +769,22 @@ else:
 
     # --- 執行最終篩選邏輯 ---
     
+    # 0. 執行關鍵字搜尋 (依相關度排序)
+    is_searching = bool(search_query.strip())
+    if is_searching:
+        search_index = get_search_index(SHOPS_DB, DATA_SNAPSHOT)
+        search_rank = {k: i for i, k in enumerate(search_shops(search_index, search_query))}
+        searched_shops = {k: SHOPS_DB[k] for k in search_rank}
+    else:
+        searched_shops = SHOPS_DB
+
     # 1. 執行地區篩選 (單層)
     selected_filter_key = clean_region_name(selected_region)
     
     if selected_filter_key == "所有地區":
-        temp_shops = SHOPS_DB
+        temp_shops = searched_shops
     else:
-        temp_shops = {k: v for k, v in SHOPS_DB.items() if v['region'] == selected_filter_key}
+        temp_shops = {k: v for k, v in searched_shops.items() if v['region'] == selected_filter_key}
 
     # 2. 執行價格篩選
     min_b, max_b = budget_range
@@ -576,18 +812,27 @@ else:
         status = get_shop_status(name, info, ORDERS_DF)
         shops_with_status.append({'name': name, 'info': info, 'status': status})
     
-    # 排序邏輯：不可用 < 可用
+    # 排序邏輯：不可用 < 可用；搜尋時可用店家依相關度排序
     shops_with_status_sorted = []
     for item in shops_with_status:
+        if is_searching:
+            sort_key = (not item['status']['is_available'], search_rank[item['name']])
+        else:
+            sort_key = (not item['status']['is_available'], -item['status']['current_stock'])
         shops_with_status_sorted.append({
             'name': item['name'],
             'info': item['info'],
             'status': item['status'],
-            'sort_key': (not item['status']['is_available'], -item['status']['current_stock'])
+            'sort_key': sort_key
         })
 
     shops_with_status_sorted.sort(key=lambda x: x['sort_key'])
 
+    # 搜尋結果在地區/預算篩選後才截斷，只影響顯示筆數
+    if is_searching and len(shops_with_status_sorted) > SEARCH_LIMIT:
+        st.caption(f"🔍 共 {len(shops_with_status_sorted)} 筆符合，顯示前 {SEARCH_LIMIT} 筆，請輸入更精確的關鍵字。")
+        shops_with_status_sorted = shops_with_status_sorted[:SEARCH_LIMIT]
+
 
     # 顯示列表
     cols_per_row = 3
@@ -595,13 +840,13 @@ else:
         st.info(f"在選定的地區和預算範圍內沒有找到任何剩食項目。")
     else:
         
-        # 依地區分組顯示 (消費者介面)
+        # 依地區分組顯示 (消費者介面)；搜尋時不分組，保留相關度順序
         shops_by_region_consumer = {}
         for item in shops_with_status_sorted:
             name = item['name']
             info = item['info']
             status = item['status']
-            region = info['region']
+            region = "🔍 搜尋結果" if is_searching else info['region']
             if region not in shops_by_region_consumer:
                 shops_by_region_consumer[region] = {}
             
@@ -610,7 +855,10 @@ else:
         sorted_regions_consumer = sorted(shops_by_region_consumer.keys())
         
         for region_name in sorted_regions_consumer:
-            st.markdown(f"### {region_name} 區域 ({len(shops_by_region_consumer[region_name])} 店)")
+            if is_searching:
+                st.markdown(f"### {region_name} ({len(shops_by_region_consumer[region_name])} 店)")
+            else:
+                st.markdown(f"### {region_name} 區域 ({len(shops_by_region_consumer[region_name])} 店)")
             
             cols = st.columns(cols_per_row)
             
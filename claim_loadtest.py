@@ -0,0 +1,102 @@
+"""claim_server 壓力測試
+
+在同一程序內啟動領取服務 (不寫回數據庫)，以多條 keep-alive 連線並發送出領取請求，
+驗證：成功數 == 庫存、無重複領取、剩餘庫存為 0，並回報每秒請求數與延遲。
+
+執行：python claim_loadtest.py --requests 20000 --concurrency 100 --stock 1000
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+
+from claim_server import ClaimStore, start_server
+
+ITEM = "限量商品"
+
+
+async def send(reader, writer, method, path, payload=None):
+    body = b"" if payload is None else json.dumps(payload, ensure_ascii=False).encode()
+    writer.write(
+        f"{method} {path} HTTP/1.1\r\nHost: localhost\r\nContent-Length: {len(body)}\r\n\r\n".encode() + body)
+    head = await reader.readuntil(b"\r\n\r\n")
+    status = int(head.split(b" ", 2)[1])
+    length = 0
+    for line in head.split(b"\r\n"):
+        if line.lower().startswith(b"content-length:"):
+            length = int(line.split(b":", 1)[1])
+    data = await reader.readexactly(length) if length else b""
+    return status, (json.loads(data) if data else None)
+
+
+async def worker(port, users, results, latencies):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    try:
+        for user in users:
+            start = time.perf_counter()
+            status, data = await send(reader, writer, "POST", "/claim", {"user": user, "item": ITEM})
+            latencies.append(time.perf_counter() - start)
+            results.append((user, status, data["result"]))
+    finally:
+        writer.close()
+        await writer.wait_closed()
+
+
+async def run(args):
+    store = ClaimStore({ITEM: args.stock})
+    server = await start_server(store, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+
+    # 每位使用者送出 args.repeat 次，用以驗證一人一份
+    unique = args.requests // args.repeat
+    users = [f"user-{i % unique}" for i in range(args.requests)]
+    chunks = [users[i::args.concurrency] for i in range(args.concurrency)]
+    results, latencies = [], []
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(port, chunk, results, latencies) for chunk in chunks))
+    elapsed = time.perf_counter() - start
+
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    _, remaining = await send(reader, writer, "GET", "/stock")
+    writer.close()
+    await writer.wait_closed()
+    await asyncio.sleep(0.1)  # 讓伺服器端連線讀到 EOF 後結束
+    server.close()
+    await server.wait_closed()
+
+    winners = [user for user, status, result in results if result == "success"]
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2] * 1000
+    p99 = latencies[int(len(latencies) * 0.99)] * 1000
+    print(f"請求數：{len(results)}  連線數：{args.concurrency}  耗時：{elapsed:.2f}s")
+    print(f"吞吐量：{len(results) / elapsed:,.0f} req/s  延遲 p50：{p50:.2f}ms  p99：{p99:.2f}ms")
+    print(f"成功領取：{len(winners)} / 庫存 {args.stock}  剩餘：{remaining['stock'][ITEM]}  待寫回：{store.pending.qsize()}")
+
+    errors = []
+    if len(winners) != min(args.stock, unique):
+        errors.append("成功數與庫存不符")
+    if len(set(winners)) != len(winners):
+        errors.append("同一使用者重複領取")
+    if remaining['stock'][ITEM] != args.stock - len(winners):
+        errors.append("剩餘庫存不一致")
+    if store.pending.qsize() != len(winners):
+        errors.append("待寫回紀錄數與成功數不符")
+    if len(results) / elapsed < args.min_rps:
+        errors.append(f"吞吐量低於 {args.min_rps} req/s")
+    for e in errors:
+        print(f"❌ {e}")
+    return not errors
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="claim_server 壓力測試")
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--stock", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=2, help="每位使用者重複送出次數")
+    parser.add_argument("--min-rps", type=float, default=1000)
+    ok = asyncio.run(run(parser.parse_args()))
+    print("✅ 通過" if ok else "❌ 失敗")
+    sys.exit(0 if ok else 1)
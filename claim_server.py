@@ -0,0 +1,329 @@
+"""限時搶購領取服務 (asyncio JSON HTTP)
+
+提供 index.html 使用的 /claim 與 /stock 端點：
+- 庫存保存在記憶體中，單一事件迴圈內扣減，天然原子化
+- 每位使用者對同一商品只能領取一次
+- 已接受的領取紀錄以非同步批次寫回「領取紀錄」工作表，關閉時會先寫完再結束
+
+啟動：python claim_server.py --stock 限量商品=100
+商品名稱即庫存鍵，需與 index.html 的 CLAIM_ITEM 一致，且不可與「店家設定」的店名相同
+(店家由 app.py 直接寫入「領取紀錄」販售，兩邊同時販售同一店家會超賣)。
+重新啟動時會依「領取紀錄」中該商品的列數扣除已領取庫存 (與 app.py get_shop_status 相同算法)。
+未設定 .streamlit/secrets.toml 時需加上 --no-persist 才會啟動 (領取紀錄不寫回)。
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import tomllib
+import urllib.parse
+from datetime import datetime
+
+log = logging.getLogger("claim_server")
+
+# ==========================================
+# 1. 系統全域設定 (與 app.py 相同)
+# ==========================================
+SPREADSHEET_ID = "1H69bfNsh0jf4SdRdiilUOsy7dH6S_cde4Dr_5Wii7Dw"
+SECRETS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".streamlit", "secrets.toml")
+
+DEFAULT_HOST = "0.0.0.0"
+DEFAULT_PORT = 8502
+FLUSH_INTERVAL = 1.0   # 秒：寫回數據庫的批次間隔
+FLUSH_BATCH = 500      # 單次 append_rows 最多筆數
+MAX_BODY = 4096        # 領取請求 body 上限 (bytes)
+IDLE_TIMEOUT = 10.0    # 秒：連線閒置 / 請求未送完即關閉
+
+
+# ==========================================
+# 2. 數據庫連線 (與 app.py 的 get_client 相同憑證)
+# ==========================================
+
+def get_client():
+    try:
+        import gspread
+        from oauth2client.service_account import ServiceAccountCredentials
+        with open(SECRETS_PATH, "rb") as f:
+            secrets = tomllib.load(f)
+        if "gcp_service_account" not in secrets: return None
+        scope = ['https://spreadsheets.google.com/feeds', 'https://www.googleapis.com/auth/drive']
+        creds = ServiceAccountCredentials.from_json_keyfile_dict(dict(secrets["gcp_service_account"]), scope)
+        return gspread.authorize(creds)
+    except Exception: return None
+
+
+def load_sheet_state(client, items):
+    """讀取店家名稱與既有領取紀錄，回傳 (shop_names, claimed)
+
+    claimed 為 {商品: [user_id, ...]}，每列一筆 (與 app.py get_shop_status 一樣以列數計算已領取數)。
+    """
+    ss = client.open_by_key(SPREADSHEET_ID)
+    shop_names = {str(row.get('店名', '')).strip() for row in ss.worksheet("店家設定").get_all_records()}
+
+    claimed = {}
+    for row in ss.worksheet("領取紀錄").get_all_records():
+        store = str(row.get('store', '')).strip()
+        if store in items:
+            claimed.setdefault(store, []).append(str(row.get('user_id', '')).strip())
+    return shop_names, claimed
+
+
+# ==========================================
+# 3. 庫存與領取邏輯
+# ==========================================
+
+class ClaimStore:
+    """記憶體庫存：所有操作都在事件迴圈執行緒中完成，不需要鎖"""
+
+    def __init__(self, stock, claimed=None, persist=True):
+        claimed = claimed or {}
+        # 剩餘庫存 = 初始庫存 - 已領取列數
+        self.stock = {k: max(int(v) - len(claimed.get(k, ())), 0) for k, v in stock.items()}
+        self.claimed = {k: set(v) - {''} for k, v in claimed.items()}
+        self.persist = persist
+        self.pending = asyncio.Queue()
+
+    def claim(self, store, user_id, user_name, item):
+        """嘗試領取，回傳 (ok, message)；成功時將紀錄排入寫回佇列"""
+        if store not in self.stock:
+            return False, f"找不到商品：{store}"
+        users = self.claimed.setdefault(store, set())
+        if user_id in users:
+            return False, "您已經領取過了，請勿重複操作。"
+        if self.stock[store] <= 0:
+            return False, "已售完！"
+        self.stock[store] -= 1
+        users.add(user_id)
+        if self.persist: self.pending.put_nowait([
+            datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            user_id,
+            user_name,
+            store,
+            f"{store} - {item}" if item and item != store else store,
+        ])
+        return True, f"領取成功！剩餘 {self.stock[store]} 份。"
+
+
+def _drain_pending(store, buffer):
+    while not store.pending.empty():
+        buffer.append(store.pending.get_nowait())
+
+
+async def flush_claims(store, client, interval=FLUSH_INTERVAL):
+    """背景任務：批次將領取紀錄 append 至「領取紀錄」工作表；被取消時先寫完剩餘紀錄"""
+    ws = None
+    buffer = [] # 尚未寫回的紀錄，依領取順序排列；寫入失敗時保留在前端重試
+
+    def write(rows):
+        nonlocal ws
+        if ws is None:
+            ws = client.open_by_key(SPREADSHEET_ID).worksheet("領取紀錄")
+        ws.append_rows(rows, value_input_option='USER_ENTERED')
+
+    async def flush_once():
+        nonlocal ws
+        rows = buffer[:FLUSH_BATCH]
+        # shield：取消時讓進行中的寫入完成，避免已寫入的紀錄在關閉時重寫一次
+        inflight = asyncio.ensure_future(asyncio.to_thread(write, rows))
+        try:
+            await asyncio.shield(inflight)
+        except asyncio.CancelledError:
+            try: await inflight
+            except Exception: ws = None
+            else: del buffer[:len(rows)]
+            raise
+        except Exception as e:
+            # 寫入失敗：保留原順序等待下次重試，庫存不回滾
+            log.warning("寫回失敗 (%s)，%d 筆稍後重試", e, len(buffer))
+            ws = None
+            return False
+        del buffer[:len(rows)]
+        return True
+
+    try:
+        while True:
+            if not buffer:
+                buffer.append(await store.pending.get())
+            await asyncio.sleep(interval)
+            _drain_pending(store, buffer)
+            await flush_once()
+    finally:
+        # 關閉服務：寫回所有已接受但尚未寫入的紀錄
+        _drain_pending(store, buffer)
+        while buffer and await flush_once():
+            pass
+        if buffer:
+            log.error("關閉前寫回失敗，以下 %d 筆領取紀錄未寫入：%s",
+                      len(buffer), json.dumps(buffer, ensure_ascii=False))
+        else:
+            log.info("領取紀錄已全部寫回")
+
+
+# ==========================================
+# 4. HTTP 處理
+# ==========================================
+
+REASONS = {200: "OK", 204: "No Content", 400: "Bad Request", 404: "Not Found",
+           405: "Method Not Allowed", 409: "Conflict", 413: "Payload Too Large"}
+
+CORS_HEADERS = (
+    b"Access-Control-Allow-Origin: *\r\n"
+    b"Access-Control-Allow-Methods: GET, POST, OPTIONS\r\n"
+    b"Access-Control-Allow-Headers: Content-Type\r\n"
+)
+
+
+def build_response(status, payload=None, keep_alive=True):
+    body = b"" if payload is None else json.dumps(payload, ensure_ascii=False).encode()
+    head = (
+        f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+        f"Content-Type: application/json; charset=utf-8\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+    ).encode()
+    return head + CORS_HEADERS + b"\r\n" + body
+
+
+def handle_claim(store, body):
+    try:
+        data = json.loads(body or b"{}")
+        user_name = str(data.get('user', '')).strip()
+        user_id = str(data.get('user_id', '') or user_name).strip()
+        item = str(data.get('item', '')).strip()
+        target = str(data.get('store', '') or item).strip()
+    except Exception:
+        return 400, {"result": "error", "message": "請求格式錯誤"}
+
+    if not user_name or not target:
+        return 400, {"result": "error", "message": "請輸入名字"}
+
+    ok, message = store.claim(target, user_id, user_name, item)
+    if ok:
+        return 200, {"result": "success", "message": message, "remaining": store.stock[target]}
+    return 409, {"result": "error", "message": message, "remaining": store.stock.get(target, 0)}
+
+
+def handle_stock(store, query):
+    target = urllib.parse.parse_qs(query).get('item', [None])[0]
+    if target is None:
+        return 200, {"stock": store.stock}
+    if target not in store.stock:
+        return 404, {"result": "error", "message": f"找不到商品：{target}"}
+    return 200, {"item": target, "remaining": store.stock[target]}
+
+
+async def serve_connection(store, reader, writer):
+    try:
+        while True:
+            try:
+                head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), IDLE_TIMEOUT)
+            except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError, TimeoutError):
+                break
+
+            lines = head.decode("latin-1").split("\r\n")
+            try:
+                method, target, version = lines[0].split(" ", 2)
+            except ValueError:
+                writer.write(build_response(400, {"result": "error", "message": "請求格式錯誤"}, False))
+                break
+            headers = {}
+            for line in lines[1:]:
+                k, sep, v = line.partition(":")
+                if sep:
+                    headers[k.strip().lower()] = v.strip()
+
+            keep_alive = headers.get("connection", "").lower() != "close" and version == "HTTP/1.1"
+            try:
+                length = int(headers.get("content-length", 0) or 0)
+            except ValueError:
+                length = -1
+            if length < 0 or length > MAX_BODY:
+                writer.write(build_response(413, {"result": "error", "message": "請求過大"}, False))
+                break
+            try:
+                body = await asyncio.wait_for(reader.readexactly(length), IDLE_TIMEOUT) if length else b""
+            except TimeoutError:
+                break
+
+            path, _, query = target.partition("?")
+            if method == "OPTIONS":
+                status, payload = 204, None
+            elif path == "/claim":
+                status, payload = handle_claim(store, body) if method == "POST" else (405, None)
+            elif path == "/stock":
+                status, payload = handle_stock(store, query) if method == "GET" else (405, None)
+            else:
+                status, payload = 404, {"result": "error", "message": "找不到頁面"}
+
+            writer.write(build_response(status, payload, keep_alive))
+            await writer.drain()
+            if not keep_alive:
+                break
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+async def start_server(store, host=DEFAULT_HOST, port=DEFAULT_PORT):
+    return await asyncio.start_server(
+        lambda r, w: serve_connection(store, r, w), host, port, backlog=1024)
+
+
+# ==========================================
+# 5. 啟動
+# ==========================================
+
+def parse_stock_arg(value):
+    """argparse type：將「商品=數量」轉為 (商品, 數量)"""
+    name, sep, count = value.rpartition("=")
+    try:
+        count = int(count)
+    except ValueError:
+        count = -1
+    if not sep or not name.strip() or count < 0:
+        raise argparse.ArgumentTypeError(f"庫存格式應為 商品=數量 (數量為非負整數)：{value}")
+    return name.strip(), count
+
+
+async def main(args):
+    client = None if args.no_persist else get_client()
+    if client is None and not args.no_persist:
+        raise SystemExit("無法連線至數據庫，請檢查 .streamlit/secrets.toml，或加上 --no-persist 以不寫回方式啟動。")
+    if args.no_persist:
+        log.warning("--no-persist：領取紀錄只保存在記憶體，不會寫回「領取紀錄」。")
+
+    stock, claimed = dict(args.stock), {}
+    if client is not None:
+        shop_names, claimed = await asyncio.to_thread(load_sheet_state, client, set(stock))
+        overlap = sorted(set(stock) & shop_names)
+        if overlap:
+            raise SystemExit(f"商品名稱與「店家設定」店名相同，會與 app.py 重複販售：{', '.join(overlap)}")
+
+    store = ClaimStore(stock, claimed, persist=client is not None)
+    server = await start_server(store, args.host, args.port)
+    flusher = asyncio.create_task(flush_claims(store, client)) if store.persist else None
+    log.info("領取服務啟動於 %s:%d，庫存：%s", args.host, args.port, store.stock)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        if flusher is not None:
+            # 取消等待中的批次間隔，flush_claims 會在結束前寫完所有紀錄
+            flusher.cancel()
+            await asyncio.gather(flusher, return_exceptions=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="限時搶購領取服務")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--stock", action="append", type=parse_stock_arg, required=True,
+                        metavar="商品=數量", help="可重複指定")
+    parser.add_argument("--no-persist", action="store_true", help="不寫回數據庫 (僅供測試)")
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    try:
+        asyncio.run(main(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass